@@ -2,12 +2,14 @@ import os
 import asyncio
 import logging
 import re
+import sys
 from datetime import datetime, timedelta
 from io import BytesIO, StringIO
 from typing import Dict, List, Set, Tuple, Optional
 import random
 import time
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
+from functools import lru_cache
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
@@ -28,6 +30,9 @@ logger = logging.getLogger(__name__)
 # ============================================================================
 TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")  # Set in Render environment variables
 PORT = int(os.environ.get("PORT", 8443))
+API_CONCURRENCY = 20  # Max simultaneous API checks across all users
+CHECK_CACHE_TTL = 3600  # Seconds a WhatsApp result is reused before re-checking
+CHECK_CACHE_MAX_SIZE = 10000  # Max numbers kept in the WhatsApp result cache
 TIMEZONE_OFFSET = "+1"  # UTC+1
 
 # Valid country codes (extend as needed)
@@ -53,6 +58,8 @@ VALID_COUNTRY_CODES = {
     '971', '972', '973', '974', '975', '976', '977', '992', '993',
     '994', '995', '996', '998'
 }
+# Prefix lengths to try when looking up a country code
+COUNTRY_CODE_LENGTHS = sorted({len(cc) for cc in VALID_COUNTRY_CODES})
 
 # ============================================================================
 # USER DATA MANAGEMENT
@@ -105,6 +112,12 @@ def get_user_data(user_id: int) -> UserData:
 # ============================================================================
 # NUMBER PROCESSING & VALIDATION
 # ============================================================================
+# Characters stripped from numbers before validation
+FORMATTING_CHARS_RE = re.compile(r'[\s\-()]')
+# Separators between numbers in pasted text (newline is covered by \s)
+NUMBER_DELIMITERS_RE = re.compile(r'[,\s;]+')
+
+@lru_cache(maxsize=4096)
 def normalize_phone_number(number: str) -> Optional[str]:
     """
     Normalize phone number to E.164 format without +
@@ -112,8 +125,9 @@ def normalize_phone_number(number: str) -> Optional[str]:
     # Remove all non-digit characters except leading +
     number = number.strip()
     
-    # Remove spaces, dashes, parentheses
-    number = re.sub(r'[\s\-()]', '', number)
+    # Remove spaces, dashes, parentheses (skipped if already plain digits)
+    if not number.lstrip('+').isdigit():
+        number = FORMATTING_CHARS_RE.sub('', number)
     
     # Handle + prefix
     if number.startswith('+'):
@@ -126,12 +140,11 @@ def normalize_phone_number(number: str) -> Optional[str]:
     if len(number) < 8 or len(number) > 15:
         return None
     
-    # Extract country code
-    for cc in VALID_COUNTRY_CODES:
-        if number.startswith(cc):
-            # Ensure there's a subscriber number after country code
-            if len(number) > len(cc):
-                return number
+    # Extract country code by prefix lookup instead of scanning every code
+    for cc_len in COUNTRY_CODE_LENGTHS:
+        # Ensure there's a subscriber number after country code
+        if number[:cc_len] in VALID_COUNTRY_CODES and len(number) > cc_len:
+            return number
     
     # If no country code matches, assume it's already a national number
     # You might want to add a default country code here
@@ -141,18 +154,14 @@ def extract_numbers_from_text(text: str) -> List[str]:
     """Extract and normalize phone numbers from text"""
     numbers = []
     
-    # Split by lines and common delimiters
-    lines = text.split('\n')
-    for line in lines:
-        # Split by comma, semicolon, tab, or space
-        parts = re.split(r'[,\s;]+', line.strip())
-        for part in parts:
-            if part:
-                normalized = normalize_phone_number(part)
-                if normalized:
-                    numbers.append(normalized)
+    # Split by newline, comma, semicolon, tab, or space in a single pass
+    for part in NUMBER_DELIMITERS_RE.split(text):
+        if part:
+            normalized = normalize_phone_number(part)
+            if normalized:
+                numbers.append(normalized)
     
-    return list(set(numbers))  # Remove duplicates
+    return list(dict.fromkeys(numbers))  # Remove duplicates, keeping input order
 
 def extract_numbers_from_file(file_content: bytes, filename: str) -> List[str]:
     """Extract numbers from uploaded file"""
@@ -165,23 +174,54 @@ def extract_numbers_from_file(file_content: bytes, filename: str) -> List[str]:
         
         elif filename.endswith('.csv'):
             text = file_content.decode('utf-8', errors='ignore')
-            # Simple CSV parsing - look for numbers in all cells
-            lines = text.split('\n')
-            for line in lines:
+            # Simple CSV parsing - look for numbers in all cells,
+            # ignoring quotes around a cell
+            for line in text.split('\n'):
                 cells = line.split(',')
                 for cell in cells:
-                    normalized = normalize_phone_number(cell.strip())
+                    normalized = normalize_phone_number(cell.strip().strip('"'))
                     if normalized:
                         numbers.append(normalized)
     
     except Exception as e:
         logger.error(f"Error parsing file: {e}")
     
-    return list(set(numbers))
+    return list(dict.fromkeys(numbers))
 
 # ============================================================================
 # SIMULATION FUNCTIONS (Replace with actual API calls)
 # ============================================================================
+# Shared limit so concurrent batches don't flood the API
+# (created on first use so it binds to the running event loop)
+api_semaphore: Optional[asyncio.Semaphore] = None
+
+def get_api_semaphore() -> asyncio.Semaphore:
+    """Get or create the shared API concurrency limit"""
+    global api_semaphore
+    if api_semaphore is None:
+        api_semaphore = asyncio.Semaphore(API_CONCURRENCY)
+    return api_semaphore
+
+# Recent WhatsApp results: number -> (checked_at, result), oldest first
+# (for production, use Redis/Database)
+whatsapp_cache: "OrderedDict[str, Tuple[float, Tuple[bool, str]]]" = OrderedDict()
+
+def prune_cache(cache: OrderedDict) -> None:
+    """Drop expired entries and trim the cache to its max size"""
+    now = time.time()
+    # Entries are in check order, so expired ones are always at the front
+    while cache:
+        checked_at, _ = next(iter(cache.values()))
+        if now - checked_at < CHECK_CACHE_TTL and len(cache) <= CHECK_CACHE_MAX_SIZE:
+            break
+        cache.popitem(last=False)
+
+def cache_result(cache: OrderedDict, number: str, result) -> None:
+    """Store a fresh result at the end of the cache"""
+    cache.pop(number, None)
+    cache[number] = (time.time(), result)
+    prune_cache(cache)
+
 async def check_whatsapp_status(number: str) -> Tuple[bool, str]:
     """
     Simulate WhatsApp check
@@ -220,6 +260,34 @@ async def check_sms_status(number: str) -> Tuple[bool, str, Optional[str]]:
     else:
         return False, "Cannot receive SMS", None
 
+async def _limited_check(check, number: str, cache: Optional[OrderedDict] = None):
+    """
+    Run a single API check, bounded by the shared concurrency limit
+    Fresh results in cache are returned without calling the API
+    """
+    if cache is not None:
+        cached = cache.get(number)
+        if cached and time.time() - cached[0] < CHECK_CACHE_TTL:
+            return cached[1]
+    
+    async with get_api_semaphore():
+        result = await check(number)
+    
+    if cache is not None:
+        cache_result(cache, number, result)
+    return result
+
+async def check_batch(check, batch: List[str], enabled: bool, cache: Optional[OrderedDict] = None) -> List:
+    """
+    Run one kind of check for a whole batch concurrently
+    Returns None for every number if the check is disabled
+    """
+    if not enabled:
+        return [None] * len(batch)
+    if cache is not None:
+        prune_cache(cache)
+    return await asyncio.gather(*(_limited_check(check, number, cache) for number in batch))
+
 async def process_numbers(
     numbers: List[str],
     user_data: UserData
@@ -245,39 +313,38 @@ async def process_numbers(
         'combo': 0
     }
     
+    # Read settings once instead of per number
+    ops = user_data.operations
+    check_whatsapp = ops['whatsapp']
+    check_sms = ops['sms']
+    whatsapp_type = ops['whatsapp_type']
+    sms_type = ops['sms_type']
+    combo_mode = ops['combo_mode']
+    
     # Process in batches to avoid blocking
-    batch_size = 10
+    batch_size = 20
     for i in range(0, len(numbers), batch_size):
         batch = numbers[i:i + batch_size]
-        batch_tasks = []
         
-        for number in batch:
-            # Create tasks based on selected operations
-            task_info = {'number': number}
-            
-            if user_data.operations['whatsapp']:
-                task_info['whatsapp_task'] = asyncio.create_task(check_whatsapp_status(number))
-            
-            if user_data.operations['sms']:
-                task_info['sms_task'] = asyncio.create_task(check_sms_status(number))
-            
-            batch_tasks.append(task_info)
+        # Run all checks for the batch concurrently
+        whatsapp_batch, sms_batch = await asyncio.gather(
+            check_batch(check_whatsapp_status, batch, check_whatsapp, whatsapp_cache),
+            check_batch(check_sms_status, batch, check_sms)
+        )
         
-        # Wait for all tasks in batch
-        for task_info in batch_tasks:
-            number = task_info['number']
+        for number, whatsapp_check, sms_check in zip(batch, whatsapp_batch, sms_batch):
             whatsapp_result = None
             sms_result = None
             
-            if 'whatsapp_task' in task_info:
-                whatsapp_status, whatsapp_msg = await task_info['whatsapp_task']
+            if whatsapp_check:
+                whatsapp_status, whatsapp_msg = whatsapp_check
                 whatsapp_result = {
                     'status': whatsapp_status,
                     'message': whatsapp_msg
                 }
             
-            if 'sms_task' in task_info:
-                sms_status, sms_msg, sms_wait = await task_info['sms_task']
+            if sms_check:
+                sms_status, sms_msg, sms_wait = sms_check
                 sms_result = {
                     'status': sms_status,
                     'message': sms_msg,
@@ -288,26 +355,26 @@ async def process_numbers(
             whatsapp_match = True
             sms_match = True
             
-            if user_data.operations['whatsapp']:
-                if user_data.operations['whatsapp_type'] == 'on':
+            if check_whatsapp:
+                if whatsapp_type == 'on':
                     whatsapp_match = whatsapp_result['status'] if whatsapp_result else False
-                elif user_data.operations['whatsapp_type'] == 'off':
+                elif whatsapp_type == 'off':
                     whatsapp_match = not whatsapp_result['status'] if whatsapp_result else False
             
-            if user_data.operations['sms']:
-                if user_data.operations['sms_type'] == 'on':
+            if check_sms:
+                if sms_type == 'on':
                     sms_match = sms_result['status'] if sms_result else False
-                elif user_data.operations['sms_type'] == 'off':
+                elif sms_type == 'off':
                     sms_match = not sms_result['status'] if sms_result else False
             
             # Check combo condition
-            if user_data.operations['combo_mode']:
+            if combo_mode:
                 if whatsapp_match and sms_match:
                     results['combo'].append(number)
                     stats['combo'] += 1
             else:
                 # Individual results
-                if whatsapp_match and user_data.operations['whatsapp']:
+                if whatsapp_match and check_whatsapp:
                     if whatsapp_result and whatsapp_result['status']:
                         results['whatsapp_on'].append(number)
                         stats['whatsapp_on'] += 1
@@ -315,7 +382,7 @@ async def process_numbers(
                         results['whatsapp_off'].append(number)
                         stats['whatsapp_off'] += 1
                 
-                if sms_match and user_data.operations['sms']:
+                if sms_match and check_sms:
                     if sms_result and sms_result['status']:
                         results['sms_on'].append(number)
                         stats['sms_on'] += 1
@@ -340,58 +407,63 @@ def generate_result_file(results: Dict, user_data: UserData) -> BytesIO:
     """
     Generate result file based on operations
     """
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    now = datetime.now()
+    timestamp = now.strftime("%Y%m%d_%H%M%S")
+    display_time = now.strftime('%Y-%m-%d %H:%M:%S')
+    
+    # Write into a buffer instead of re-concatenating a growing string
+    content = StringIO()
     
     if user_data.operations['combo_mode']:
         filename = f"combo_results_{timestamp}.txt"
-        content = "=== COMBO RESULTS ===\n"
-        content += f"Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} (UTC{TIMEZONE_OFFSET})\n"
-        content += f"Operations: {' AND '.join(user_data.get_operations_display())}\n\n"
+        content.write("=== COMBO RESULTS ===\n")
+        content.write(f"Time: {display_time} (UTC{TIMEZONE_OFFSET})\n")
+        content.write(f"Operations: {' AND '.join(user_data.get_operations_display())}\n\n")
         
         if results['combo']:
-            content += "Numbers matching ALL conditions:\n"
+            content.write("Numbers matching ALL conditions:\n")
             for number in results['combo']:
-                content += f"+{number}\n"
+                content.write(f"+{number}\n")
         else:
-            content += "No numbers matched all conditions\n"
+            content.write("No numbers matched all conditions\n")
     
     else:
         filename = f"checking_results_{timestamp}.txt"
-        content = "=== CHECKING RESULTS ===\n"
-        content += f"Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} (UTC{TIMEZONE_OFFSET})\n\n"
+        content.write("=== CHECKING RESULTS ===\n")
+        content.write(f"Time: {display_time} (UTC{TIMEZONE_OFFSET})\n\n")
         
         ops_display = user_data.get_operations_display()
         for op in ops_display:
-            content += f"{op}\n"
-        content += "\n"
+            content.write(f"{op}\n")
+        content.write("\n")
         
         if user_data.operations['whatsapp']:
             if results['whatsapp_on']:
-                content += "✅ ON WHATSAPP:\n"
+                content.write("✅ ON WHATSAPP:\n")
                 for number in results['whatsapp_on']:
-                    content += f"+{number}\n"
-                content += "\n"
+                    content.write(f"+{number}\n")
+                content.write("\n")
             
             if results['whatsapp_off']:
-                content += "❌ NOT ON WHATSAPP:\n"
+                content.write("❌ NOT ON WHATSAPP:\n")
                 for number in results['whatsapp_off']:
-                    content += f"+{number}\n"
-                content += "\n"
+                    content.write(f"+{number}\n")
+                content.write("\n")
         
         if user_data.operations['sms']:
             if results['sms_on']:
-                content += "📨 CAN RECEIVE SMS:\n"
+                content.write("📨 CAN RECEIVE SMS:\n")
                 for number in results['sms_on']:
-                    content += f"+{number}\n"
-                content += "\n"
+                    content.write(f"+{number}\n")
+                content.write("\n")
             
             if results['sms_off']:
-                content += "⏳ SMS TRY AGAIN LATER:\n"
+                content.write("⏳ SMS TRY AGAIN LATER:\n")
                 for number in results['sms_off']:
-                    content += f"+{number}\n"
+                    content.write(f"+{number}\n")
     
     # Convert to bytes
-    file_buffer = BytesIO(content.encode('utf-8'))
+    file_buffer = BytesIO(content.getvalue().encode('utf-8'))
     file_buffer.name = filename
     
     return file_buffer
@@ -431,7 +503,7 @@ I can check phone numbers for:
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /help command"""
-    help_text = """
+    help_text = f"""
 📚 **HELP GUIDE**
 
 **1. Sending Numbers:**
@@ -461,7 +533,7 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 **5. Notes:**
 - Processing may take time for large files
 - Maximum 1000 numbers per batch
-- Results are not stored
+- Results are not stored (WhatsApp status is cached in memory for about {CHECK_CACHE_TTL // 60} min to avoid re-checks)
 """
     await update.message.reply_text(help_text)
 
@@ -541,7 +613,7 @@ Use /setop to change operations
 
 async def about_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /about command"""
-    about_text = """
+    about_text = f"""
 🤖 **Number Validator Bot**
 
 **Version:** 2.0.0
@@ -561,7 +633,7 @@ Format: +[country code][number]
 
 **Privacy:**
 • Numbers are processed temporarily
-• No data storage
+• No persistent storage (WhatsApp status is cached in memory for about {CHECK_CACHE_TTL // 60} min)
 • Results auto-delete after sending
 
 **For support:** Contact developer
@@ -786,8 +858,8 @@ async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
             user_data.processing = False
             return
         
-        # Extract numbers
-        numbers = extract_numbers_from_file(file_content, filename)
+        # Extract numbers (off the event loop, files can be large)
+        numbers = await asyncio.to_thread(extract_numbers_from_file, file_content, filename)
         
         if not numbers:
             await update.message.reply_text("❌ No valid phone numbers found in the file!")
@@ -861,6 +933,16 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # ============================================================================
 def main():
     """Start the bot"""
+    # Use uvloop's faster event loop where available. PTB 20.7 runs on
+    # asyncio.get_event_loop(), so set the loop itself (uvloop.run() would
+    # bypass PTB, and loop policies are deprecated as of Python 3.14)
+    if sys.platform != 'win32':
+        try:
+            import uvloop
+            asyncio.set_event_loop(uvloop.new_event_loop())
+        except ImportError:
+            logger.info("uvloop not installed, using default asyncio event loop")
+    
     # Create Application
     application = Application.builder().token(TOKEN).build()
     